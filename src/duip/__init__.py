@@ -1,12 +1,16 @@
 from pathlib import Path
+from typing import Set
 
 from flask import Flask
 
-from .command import command_endpoints, init_commands
-from .node import init_tree, node_endpoints
+from .command import command_endpoints
+from .node import node_endpoints
 
 __version__ = "0.1.0"
 
+# Instance paths already created by this process
+_ensured_instance_paths: Set[str] = set()
+
 
 def create_app(test_config=None):
     app = Flask(__name__)
@@ -23,13 +27,13 @@ def create_app(test_config=None):
 
     # Ensure the instance folder ... exists
     # We might want to use this for DUI data files?
-    Path(app.instance_path).mkdir(exist_ok=True)
+    if app.instance_path not in _ensured_instance_paths:
+        Path(app.instance_path).mkdir(exist_ok=True)
+        _ensured_instance_paths.add(app.instance_path)
     app.logger.info(f"Instance path: {app.instance_path}")
 
-    with app.app_context():
-        init_tree()
-        init_commands()
-
+    # The tree and command registry are created on first use, rather
+    # than paying for them on every app construction
     app.register_blueprint(node_endpoints, url_prefix="/node")
     app.register_blueprint(command_endpoints, url_prefix="/command")
 
@@ -5,14 +5,38 @@ Command implementations, registration and views
 from __future__ import annotations
 
 import logging
-from typing import Dict
+import threading
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
 
-from flask import Blueprint, abort, jsonify, request, url_for
+from flask import Blueprint, Response, abort, json, jsonify, request, url_for
 
 logger = logging.getLogger(__name__)
 
-# Global list of registered commands
-COMMANDS: Dict[str, Command] = {}
+# Global list of registered commands. This is a read-only snapshot that
+# is replaced, never mutated, so readers don't need to take a lock.
+COMMANDS: Mapping[str, Command] = MappingProxyType({})
+# Serializes replacement of COMMANDS
+_COMMANDS_LOCK = threading.Lock()
+# Whether the default commands have been loaded into COMMANDS
+_commands_ready = False
+# Encoded /command/ listing, along with the registry and script root
+# that it was built for
+_ALL_COMMANDS_JSON: Optional[Tuple[Mapping[str, Command], str, bytes]] = None
+
+# (name, description) of the commands known by default
+_COMMAND_SPECS: Tuple[Tuple[str, Optional[str]], ...] = (
+    ("dials.import", None),
+    ("dials.find_spots", None),
+    ("dials.refine", None),
+    ("dials.refine_bravais_settings", None),
+    ("dials.reindex", None),
+    ("dials.integrate", None),
+    ("dials.symmetry", None),
+    ("dials.scale", None),
+    ("export", None),
+    ("mask", "Generate and apply a mask"),
+)
 
 
 class Command:
@@ -32,11 +56,22 @@ class Command:
     def __init__(self, name: str, description=None):
         self.name = name
         self.description = description or ""
+        # (script root, endpoint URL), resolved on first use in a request
+        self._url: Optional[Tuple[str, str]] = None
 
     def to_dict(self) -> Dict:
+        # The URL depends on where the app is mounted, so check that
+        # it was resolved for the same script root as this request
+        script_root = request.script_root
+        cached = self._url
+        if cached is None or cached[0] != script_root:
+            cached = self._url = (
+                script_root,
+                url_for(".command_named", name=self.name),
+            )
         data = {
             "name": self.name,
-            "endpoint": url_for(".command_named", name=self.name),
+            "endpoint": cached[1],
         }
         if self.description:
             data["description"] = self.description
@@ -46,8 +81,11 @@ class Command:
 def register_command(command: Command) -> None:
     """Register a command class"""
     global COMMANDS
-    assert command.name not in COMMANDS
-    COMMANDS[command.name] = command
+    with _COMMANDS_LOCK:
+        assert command.name not in COMMANDS
+        commands = dict(COMMANDS)
+        commands[command.name] = command
+        COMMANDS = MappingProxyType(commands)
 
 
 command_endpoints = Blueprint("commands", __name__)
@@ -57,31 +95,62 @@ def init_commands(dials_bin=None):
     """
     Read a dials bin dir and extract command information for each command
     """
-    global COMMANDS
-    COMMANDS = {}
-    register_command(Command("dials.import"))
-    register_command(Command("dials.find_spots"))
-    register_command(Command("dials.refine"))
-    register_command(Command("dials.refine_bravais_settings"))
-    register_command(Command("dials.reindex"))
-    register_command(Command("dials.integrate"))
-    register_command(Command("dials.symmetry"))
-    register_command(Command("dials.scale"))
-    register_command(Command("export"))
-    register_command(Command("mask", description="Generate and apply a mask"))
+    global COMMANDS, _commands_ready
+    commands = _default_commands()
+    with _COMMANDS_LOCK:
+        COMMANDS = MappingProxyType(commands)
+        _commands_ready = True
+
+
+def ensure_commands() -> None:
+    """Load the default commands, if nothing has done so yet.
+
+    Anything already registered e.g. by a plugin is kept alongside them.
+    """
+    global COMMANDS, _commands_ready
+    if _commands_ready:
+        return
+    with _COMMANDS_LOCK:
+        if not _commands_ready:
+            COMMANDS = MappingProxyType({**_default_commands(), **COMMANDS})
+            _commands_ready = True
+
+
+def _default_commands() -> Dict[str, Command]:
+    return {
+        name: Command(name, description=description)
+        for name, description in _COMMAND_SPECS
+    }
+
+
+command_endpoints.before_request(ensure_commands)
 
 
 @command_endpoints.route("/", strict_slashes=False)
 def all_commands():
+    commands = COMMANDS
     if request.args.get("node", None):
         # Given a node. Return valid commands for this node.
         logger.warn("Per-node command lists not currently implemented")
-    return jsonify({name: url_for(".command_named", name=name) for name in COMMANDS})
+        return jsonify(
+            {name: url_for(".command_named", name=name) for name in commands}
+        )
+    # The listing only changes when the registry does, so reuse the body
+    global _ALL_COMMANDS_JSON
+    # URLs include the mount point, so this is part of the cache key
+    script_root = request.script_root
+    cached = _ALL_COMMANDS_JSON
+    if cached is None or cached[0] is not commands or cached[1] != script_root:
+        body = json.dumps(
+            {name: url_for(".command_named", name=name) for name in commands}
+        ).encode()
+        cached = _ALL_COMMANDS_JSON = (commands, script_root, body)
+    return Response(cached[2], mimetype="application/json")
 
 
 @command_endpoints.route("/<name>")
 def command_named(name):
-    if name not in COMMANDS:
+    command = COMMANDS.get(name)
+    if command is None:
         abort(404)
-    command = COMMANDS[name]
     return command.to_dict()
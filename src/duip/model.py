@@ -1,15 +1,22 @@
 from __future__ import annotations
 
-import uuid
-from enum import Enum, auto
-from io import StringIO
+import json
+import os
+from collections import defaultdict, deque
+from enum import IntEnum
 from threading import Lock
-from typing import Dict, List, Optional, Sequence, Union
-
-import networkx as nx
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
 
 NODE_TYPES = {}
 
+# Number of node UUIDs to generate per read of the system random source
+_UUID_BATCH = 256
+_uuid_pool: deque = deque()
+_uuid_lock = Lock()
+# A forked child would otherwise hand out the same UUIDs as its parent
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_uuid_pool.clear)
+
 
 class DuplicateKeyError(Exception):
     pass
@@ -21,38 +28,57 @@ def register_node(node_subclass):
     return node_subclass
 
 
-def _render_graph(stream, node: Node, indent: str = "", last=True, first=True):
+def _render_graph(roots: Sequence[Node]) -> str:
     """Draw a textual representation of the node graph"""
-    if first:
-        first_i = ""
-        second_i = ""
-    elif last:
-        first_i = "╰─"
-        second_i = "  "
-    else:
-        first_i = "├─"
-        second_i = "│ "
-    stream.write(indent + first_i + str(node) + "\n")
-    indent = indent + second_i
-    for i, child in enumerate(list(node.children)):
-        _render_graph(
-            stream,
-            child,
-            indent=indent,
-            last=(i + 1) == len(node.children),
-            first=False,
-        )
-
-
-class NodeState(Enum):
-    def _generate_next_value_(name, start, count, last_values):  # pylint: disable=E0213
-        return name
-
-    UNCONFIRMED = auto()  # Client-side: We expect this but haven't gotten confirmation
-    CREATED = auto()  # Node exists but not confirmed running
-    RUNNING = auto()  # Node is currently in progress
-    FAILED = auto()  # Node ran but failed for some reason
-    SUCCESS = auto()  # Node ran successfully
+    parts: List[str] = []
+    # Explicit stack of (node, indent, last) so deep trees can't recurse
+    # out; pushed in reverse so that siblings pop in order
+    stack = [(root, "", i == 0) for i, root in enumerate(reversed(roots))]
+    while stack:
+        node, indent, last = stack.pop()
+        if last:
+            first_i, second_i = "╰─", "  "
+        else:
+            first_i, second_i = "├─", "│ "
+        parts.append(indent)
+        parts.append(first_i)
+        parts.append(str(node))
+        parts.append("\n")
+        indent = indent + second_i
+        children = node._children
+        for i, child in enumerate(reversed(children)):
+            stack.append((child, indent, i == 0))
+    return "".join(parts)
+
+
+def _next_uuid() -> str:
+    """
+    Get a new random hex UUID for a node.
+
+    These are drawn from a pool filled by a single os.urandom call, rather
+    than making a syscall per node. They are 128 random bits without the
+    RFC 4122 version/variant markers - they are only used as opaque keys.
+    The pool is emptied in the child after a fork, so that processes never
+    share UUIDs.
+    """
+    while True:
+        try:
+            return _uuid_pool.popleft()
+        except IndexError:
+            with _uuid_lock:
+                if not _uuid_pool:
+                    raw = os.urandom(16 * _UUID_BATCH)
+                    _uuid_pool.extend(
+                        raw[i : i + 16].hex() for i in range(0, len(raw), 16)
+                    )
+
+
+class NodeState(IntEnum):
+    UNCONFIRMED = 1  # Client-side: We expect this but haven't gotten confirmation
+    CREATED = 2  # Node exists but not confirmed running
+    RUNNING = 3  # Node is currently in progress
+    FAILED = 4  # Node ran but failed for some reason
+    SUCCESS = 5  # Node ran successfully
 
 
 @register_node
@@ -70,6 +96,28 @@ class Node:
         tree: The DUI tree object this will belong to
     """
 
+    # Trees can hold many nodes, so avoid a per-instance __dict__
+    __slots__ = (
+        "tree",
+        "parents",
+        "id",
+        "uuid",
+        "_children",
+        "_children_set",
+        "_children_tuple",
+        "_state",
+        "_state_value",
+        "_parent_ids",
+        "_json_prefix",
+    )
+
+    # Serialized name of the node type; set for every subclass
+    _type_name = "Node"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._type_name = cls.__name__
+
     def __init__(
         self,
         parents: Union[Sequence[Node], Node] = None,
@@ -78,51 +126,94 @@ class Node:
         node_uuid: str = None,
     ):
         self.tree: Optional[DUITree] = None
-        # Handle non-list parents
-        if parents is not None:
-            if isinstance(parents, Sequence):
-                self.parents = list(parents)
-            else:
-                self.parents = [parents]
-        else:
+        # Handle non-list parents. Checking for a single Node avoids the
+        # much slower abstract Sequence check; anything else is iterated.
+        if parents is None:
             self.parents = []
+        elif isinstance(parents, Node):
+            self.parents = [parents]
+        else:
+            self.parents = list(parents)
         self.id = str(node_id) if node_id is not None else None
-        self.uuid = node_uuid or uuid.uuid4().hex
+        self.uuid = node_uuid or _next_uuid()
         self._children: List[Node] = []
-        self.state = NodeState.CREATED
+        # Membership of children, by id(), to avoid scanning the list
+        self._children_set: Set[int] = set()
+        self._children_tuple: Optional[Tuple[Node, ...]] = None
+        self._state = NodeState.CREATED
+        self._state_value = self._state.value
+        # Parent IDs, cached once they are fixed by attaching to a tree
+        self._parent_ids: Optional[Tuple[str, ...]] = None
+        # Encoded to_dict, up to the state value, once attached to a tree
+        self._json_prefix: Optional[bytes] = None
 
     @property
-    def children(self):
-        return tuple(self._children)
+    def state(self) -> NodeState:
+        return self._state
+
+    @state.setter
+    def state(self, state: NodeState) -> None:
+        self._state = state
+        self._state_value = state.value
+        # Let the tree know that any serialized view is now stale
+        if self.tree is not None:
+            self.tree._touch()
+
+    @property
+    def children(self) -> Tuple[Node, ...]:
+        # Cache the immutable view; invalidated when a child is added
+        if self._children_tuple is None:
+            self._children_tuple = tuple(self._children)
+        return self._children_tuple
+
+    def _add_child(self, child: Node) -> None:
+        self._children.append(child)
+        self._children_set.add(id(child))
+        self._children_tuple = None
 
     def to_dict(self):
         """Convert this node to a plain literal representation"""
         out = {
-            "type": type(self).__name__,
+            "type": self._type_name,
             "id": self.id,
             "uuid": self.uuid,
-            "state": self.state.value,
+            "state": self._state_value,
         }
         if self.parents:
-            out["parents"] = [p.id for p in self.parents]
+            parent_ids = self._parent_ids
+            if parent_ids is None:
+                parent_ids = tuple(p.id for p in self.parents)
+            out["parents"] = list(parent_ids)
         return out
 
+    def to_json(self, dumps: Callable[[Any], str] = json.dumps) -> bytes:
+        """
+        Convert this node to the JSON encoding of it's to_dict
+
+        Args:
+            dumps: The JSON encoder to use for the dict e.g. to allow
+                a subclass to_dict to return non-native values
+        """
+        if self.tree is None or type(self).to_dict is not Node.to_dict:
+            return dumps(self.to_dict()).encode()
+        # Once attached, only the state can change. Encode everything
+        # else once, and append the state on each call.
+        if self._json_prefix is None:
+            data = self.to_dict()
+            del data["state"]
+            self._json_prefix = dumps(data)[:-1].encode() + b', "state": '
+        return self._json_prefix + b"%d}" % self._state_value
+
     @classmethod
     def from_dict(cls, tree: DUITree, data: Dict):
         """Recreate a node from it's dict literal description"""
-        # Not perfect, as race condition, but checks dev environment
-        # Problem is: This might be a superclass in which case subclass
-        # might want to alter, after creation. At the moment we don't
-        # anticipate loading from dict that often though.
-        assert tree._lock.locked()
-
         node_id = data["id"]
         node_uuid = data["uuid"]
         # DAG, so we can assume that parents are made before children
         parents = [tree.nodes[parent_id] for parent_id in data.get("parents", [])]
         # The constructor recreates all the links
         node = cls(parents=parents, node_id=node_id, node_uuid=node_uuid)
-        node.state = NodeState(data["STATE"])
+        node.state = NodeState(data["state"])
         tree.attach(node)
 
         return node
@@ -132,11 +223,21 @@ class Node:
 
 
 class DUITree:
-    """Object coordinating the DUI DAG node graph"""
+    """
+    Object coordinating the DUI DAG node graph
+
+    Only writers take the lock. Nodes are never removed, so readers can
+    look up single nodes directly, and views that iterate the tree work
+    on a snapshot copy of the node collection, so they never observe it
+    changing size underneath them.
+    """
 
     def __init__(self):
         self._next_id = 1
+        # Bumped on every change, so that views of the tree can be cached
+        self._version = 0
         self.nodes = {}
+        self._uuids = set()
         self._lock = Lock()
         self._roots = []
 
@@ -148,76 +249,101 @@ class DUITree:
 
         Returns the node.
         """
-        # Validate first before changing anything
-        if node.id in self.nodes:
-            raise DuplicateKeyError(f"Node id {node.id} already exists in tree")
-        if any(x.uuid == node.uuid for x in self.nodes.values()):
-            raise DuplicateKeyError(f"Duplicate UUID: {node.uuid}")
-        for parent in node.parents:
-            if parent.id not in self.nodes:
-                raise KeyError(f"Parent with ID {parent.id} not a member of tree")
-            if self.nodes[parent.id] is not parent:
-                raise ValueError(
-                    f"Parent with ID {parent.id} is different to existing object"
-                )
-            if node in parent.children:
-                raise RuntimeError(
-                    "Node already exists in parent children list... bad tree"
-                )
-
         with self._lock:
-            # Check that the UUID doesn't already exist
+            # Validate first before changing anything. This is done under
+            # the lock so that the checks still hold when we mutate.
+            nodes = self.nodes
+            if node.id in nodes:
+                raise DuplicateKeyError(f"Node id {node.id} already exists in tree")
+            if node.uuid in self._uuids:
+                raise DuplicateKeyError(f"Duplicate UUID: {node.uuid}")
+            for parent in node.parents:
+                existing = nodes.get(parent.id)
+                if existing is None:
+                    raise KeyError(f"Parent with ID {parent.id} not a member of tree")
+                if existing is not parent:
+                    raise ValueError(
+                        f"Parent with ID {parent.id} is different to existing object"
+                    )
+                if id(node) in parent._children_set:
+                    raise RuntimeError(
+                        "Node already exists in parent children list... bad tree"
+                    )
+
             # Generate or use the node ID
             if node.id is None:
                 node.id = str(self._next_id)
                 self._next_id += 1
             node.tree = self
+            # Parents are all attached, so their IDs can no longer change
+            node._parent_ids = tuple(p.id for p in node.parents)
             self.nodes[node.id] = node
+            self._uuids.add(node.uuid)
             # Wire up the parent links
             for parent in node.parents:
-                parent._children.append(node)
+                parent._add_child(node)
             # Track roots
             if not node.parents:
                 self._roots.append(node)
+            self._version += 1
 
         return node
 
+    def _touch(self) -> None:
+        """Mark the tree as changed, without altering the structure"""
+        with self._lock:
+            self._version += 1
+
     def to_dict(self):
-        return [node.to_dict() for node_id, node in self.nodes.items()]
+        # Copying values is a single C-level operation, so this is a
+        # consistent snapshot even while another thread is attaching
+        return [node.to_dict() for node in tuple(self.nodes.values())]
+
+    def to_json(self, dumps: Callable[[Any], str] = json.dumps) -> bytes:
+        """Get the JSON encoding of to_dict, using the given encoder"""
+        nodes = tuple(self.nodes.values())
+        return b"[" + b", ".join(node.to_json(dumps) for node in nodes) + b"]"
 
     @classmethod
-    def from_dict(self, data):
-        all_nodes = {}
-        # Determine construction order
-        graph = nx.DiGraph()
+    def from_dict(cls, data):
+        # Node ID to (node class, data), resolved once up front
+        all_nodes: Dict[str, Tuple[type, Dict]] = {}
+        # Determine construction order, parents before children
+        children_of: Dict[str, List[str]] = defaultdict(list)
+        indegree: Dict[str, int] = {}
         for node_data in data:
             node_id = node_data["id"]
-            all_nodes[node_id] = node_data
-            graph.add_node(node_id)
-            for parent in node_data.get("parents", []):
-                graph.add_edge(node_id, parent)
-        assert nx.is_directed_acyclic_graph(graph), "Node graph non-DAG"
-        node_order = list(reversed(list(nx.topological_sort(graph))))
+            node_type = node_data.get("type", "Node")
+            if node_type not in NODE_TYPES:
+                raise KeyError(f"Unknown node type {node_type}")
+            all_nodes[node_id] = (NODE_TYPES[node_type], node_data)
+            parents = node_data.get("parents", [])
+            indegree[node_id] = len(parents)
+            for parent in parents:
+                children_of[parent].append(node_id)
+        for parent in children_of:
+            if parent not in all_nodes:
+                raise KeyError(f"Parent with ID {parent} not a member of tree")
+        pending = deque(node_id for node_id, n in indegree.items() if n == 0)
+        node_order = []
+        while pending:
+            node_id = pending.popleft()
+            node_order.append(node_id)
+            for child in children_of[node_id]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    pending.append(child)
+        if len(node_order) != len(all_nodes):
+            raise ValueError("Node graph non-DAG")
         # Now sorted, safe to create
-        tree = DUITree()
+        tree = cls()
         for node_id in node_order:
-            node_type = all_nodes[node_id].get("type", "Node")
-            assert node_type in NODE_TYPES
-            tree.nodes[node_id] = NODE_TYPES[node_type].from_dict(
-                tree, all_nodes[node_id]
-            )
+            node_cls, node_data = all_nodes[node_id]
+            node_cls.from_dict(tree, node_data)
+        return tree
 
     def render_graph(self):
         """Generate an Unicode graph showing the tree structure"""
-        # Find the root nodes
-        dest = StringIO()
-
-        class FakeRoot:
-            def __str__(self):
-                return ""
-
-        root = FakeRoot()
-        root.children = [x for x in self.nodes.values() if not x.parents]
-        # for root in roots:
-        _render_graph(dest, root)
-        return dest.getvalue()
+        # The roots hang off an unlabelled top line, so start with an
+        # empty line as the output always has
+        return "\n" + _render_graph(tuple(self._roots))
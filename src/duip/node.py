@@ -1,9 +1,12 @@
+import threading
+
 from duip.model import DUITree
-from flask import Blueprint, abort, g, jsonify
+from flask import Blueprint, Response, abort, g, json, request
 
 # For now, store this globally on a per-process instance
 # This isn't... a good way, but for now keeps the model super simple
 _TREE = None
+_TREE_LOCK = threading.Lock()
 
 
 node_endpoints = Blueprint("node", __name__)
@@ -14,9 +17,18 @@ def init_tree():
     _TREE = TreeController()
 
 
+def ensure_tree() -> None:
+    """Create the global tree controller, if nothing has done so yet"""
+    if _TREE is not None:
+        return
+    with _TREE_LOCK:
+        if _TREE is None:
+            init_tree()
+
+
 def get_tree():
     """Load the DUI tree controller onto the context, and return it."""
-    assert _TREE
+    ensure_tree()
     if "tree" not in g:
         g.tree = _TREE
     return g.tree
@@ -32,15 +44,49 @@ class TreeController:
 
     def __init__(self):
         self.tree = DUITree()
+        # (tree version, encoded node list) of the last serialization
+        self._cached = (-1, b"")
 
     def get_node(self, node_id):
         return self.tree.nodes[node_id]
 
+    def get_nodes(self, node_ids, strict=False):
+        """
+        Look up several nodes at once.
+
+        Unknown IDs are skipped, unless strict, where they raise KeyError.
+        """
+        nodes = self.tree.nodes
+        if strict:
+            return [nodes[node_id] for node_id in node_ids]
+        return [nodes[node_id] for node_id in node_ids if node_id in nodes]
+
+    def nodes_json(self) -> bytes:
+        """Get the JSON-encoded list of all nodes in the tree"""
+        version, body = self._cached
+        if version != self.tree._version:
+            # Read the version first; a change during encoding just
+            # means the next call will regenerate
+            version = self.tree._version
+            body = self.tree.to_json(json.dumps)
+            self._cached = (version, body)
+        return body
+
 
 @node_endpoints.route("/", strict_slashes=False)
 def all_nodes():
     tree = get_tree()
-    return jsonify(tree.tree.to_dict())
+    ids = request.args.get("ids", None)
+    if ids is not None:
+        # Bulk fetch of a subset of nodes e.g. ?ids=1,2,3
+        strict = request.args.get("strict", "").lower() in ("1", "true", "yes")
+        try:
+            nodes = tree.get_nodes([x for x in ids.split(",") if x], strict=strict)
+        except KeyError:
+            abort(404)
+        body = b"[" + b", ".join(node.to_json(json.dumps) for node in nodes) + b"]"
+        return Response(body, mimetype="application/json")
+    return Response(tree.nodes_json(), mimetype="application/json")
 
 
 @node_endpoints.route("/<node_id>")
@@ -49,4 +95,4 @@ def get_single_node(node_id):
         node = get_tree().get_node(node_id)
     except KeyError:
         abort(404)
-    return node.to_dict()
+    return Response(node.to_json(json.dumps), mimetype="application/json")
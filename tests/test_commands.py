@@ -1,3 +1,4 @@
+import pytest
 from duip import command
 from flask import json
 
@@ -8,6 +9,7 @@ class FakeCommand(command.Command):
 
 def test_node_list(client, monkeypatch):
     monkeypatch.setattr(command, "COMMANDS", {"fake_command": FakeCommand})
+    monkeypatch.setattr(command, "_commands_ready", True)
     # Get a tree controller from the app
     resp = client.get("/command/")
     assert resp.status_code == 200
@@ -23,3 +25,54 @@ def test_get_all_commands(client):
         assert resp.status_code == 200
         info = json.loads(resp.data)
         assert info["name"] == name
+
+
+def test_commands_initialised_on_first_request(client, monkeypatch):
+    monkeypatch.setattr(command, "COMMANDS", {})
+    monkeypatch.setattr(command, "_commands_ready", False)
+    # Commands registered before first use are kept with the defaults
+    command.register_command(command.Command("plugin"))
+    commands = json.loads(client.get("/command/").data)
+    assert "dials.import" in commands
+    assert "plugin" in commands
+
+
+def test_command_list_cache_invalidated(client, monkeypatch):
+    monkeypatch.setattr(command, "COMMANDS", {})
+    monkeypatch.setattr(command, "_commands_ready", True)
+    command.register_command(command.Command("first"))
+    assert json.loads(client.get("/command/").data) == {"first": "/command/first"}
+    command.register_command(command.Command("second"))
+    assert json.loads(client.get("/command/").data) == {
+        "first": "/command/first",
+        "second": "/command/second",
+    }
+
+
+def test_register_command_replaces_snapshot(monkeypatch):
+    monkeypatch.setattr(command, "COMMANDS", command.MappingProxyType({}))
+    before = command.COMMANDS
+    command.register_command(command.Command("new"))
+    assert "new" in command.COMMANDS
+    assert "new" not in before
+    with pytest.raises(TypeError):
+        command.COMMANDS["other"] = command.Command("other")
+
+
+def test_command_list_mount_point(client, monkeypatch):
+    monkeypatch.setattr(command, "COMMANDS", {})
+    monkeypatch.setattr(command, "_commands_ready", True)
+    command.register_command(command.Command("first"))
+    resp = client.get("/command/", base_url="http://localhost/prefix/")
+    assert json.loads(resp.data) == {"first": "/prefix/command/first"}
+    assert json.loads(client.get("/command/").data) == {"first": "/command/first"}
+
+
+def test_command_endpoint_mount_point(client, monkeypatch):
+    monkeypatch.setattr(command, "COMMANDS", {})
+    monkeypatch.setattr(command, "_commands_ready", True)
+    command.register_command(command.Command("first"))
+    resp = client.get("/command/first", base_url="http://localhost/prefix/")
+    assert json.loads(resp.data)["endpoint"] == "/prefix/command/first"
+    resp = client.get("/command/first")
+    assert json.loads(resp.data)["endpoint"] == "/command/first"
@@ -1,5 +1,9 @@
+import json
+import os
+import threading
+
 import pytest
-from duip.model import NODE_TYPES, DUITree, DuplicateKeyError, Node
+from duip.model import NODE_TYPES, DUITree, DuplicateKeyError, Node, NodeState
 
 
 def test_node_types():
@@ -39,6 +43,105 @@ def test_node_creation_manipulation():
 def test_to_from_dict():
     tree = DUITree()
     nodeA = tree.attach(Node())
+    nodeB = tree.attach(Node([nodeA]))
+    tree.attach(Node([nodeA, nodeB]))
+
+    data = tree.to_dict()
+    # Construction order shouldn't depend on the listed order
+    new_tree = DUITree.from_dict(list(reversed(data)))
+    assert sorted(new_tree.to_dict(), key=lambda x: x["id"]) == data
+    assert new_tree.render_graph() == tree.render_graph()
+
+    # Cycles are rejected
+    with pytest.raises(ValueError):
+        DUITree.from_dict(
+            [
+                {"id": "1", "uuid": "a", "state": 2, "parents": ["2"]},
+                {"id": "2", "uuid": "b", "state": 2, "parents": ["1"]},
+            ]
+        )
+
+
+def test_render_graph():
+    tree = DUITree()
+    nodeA = tree.attach(Node())
+    tree.attach(Node([nodeA]))
     tree.attach(Node([nodeA]))
+    tree.attach(Node())
+    # Roots are drawn below an empty first line
+    assert tree.render_graph() == (
+        "\n" "├─Node 1\n" "│ ├─Node 2\n" "│ ╰─Node 3\n" "╰─Node 4\n"
+    )
+    assert DUITree().render_graph() == "\n"
+
+    # Deep trees shouldn't hit the recursion limit
+    deep = DUITree()
+    node = deep.attach(Node())
+    for _ in range(5000):
+        node = deep.attach(Node(node))
+    assert deep.render_graph().count("\n") == 5002
+
+
+def test_generated_uuids():
+    uuids = {Node().uuid for _ in range(1000)}
+    assert len(uuids) == 1000
+    assert all(len(x) == 32 and int(x, 16) >= 0 for x in uuids)
+
+
+def test_node_subclass_type_name():
+    class OtherNode(Node):
+        pass
+
+    tree = DUITree()
+    node = tree.attach(Node())
+    assert node.to_dict()["type"] == "Node"
+    assert tree.attach(OtherNode(node)).to_dict()["type"] == "OtherNode"
+
+
+def test_concurrent_attach_and_read():
+    tree = DUITree()
+    root = tree.attach(Node())
+
+    def writer():
+        for _ in range(2000):
+            tree.attach(Node(root))
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while thread.is_alive():
+        tree.to_dict()
+        tree.render_graph()
+    thread.join()
+    assert len(tree.to_dict()) == 2001
+
+
+def test_node_to_json():
+    class OtherNode(Node):
+        def to_dict(self):
+            return {**super().to_dict(), "extra": 1}
+
+    tree = DUITree()
+    nodeA = tree.attach(Node())
+    nodeB = tree.attach(OtherNode(nodeA))
+    nodeC = tree.attach(Node([nodeA, nodeB]))
+    for node in (Node(), nodeA, nodeB, nodeC):
+        assert json.loads(node.to_json()) == node.to_dict()
+    nodeC.state = NodeState.SUCCESS
+    assert json.loads(nodeC.to_json())["state"] == NodeState.SUCCESS
+    assert json.loads(tree.to_json()) == tree.to_dict()
+
 
-    print(tree.to_dict())
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="Requires os.fork")
+def test_generated_uuids_after_fork():
+    Node()  # Make sure the pool is populated
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, Node().uuid.encode())
+        os._exit(0)
+    os.close(write_fd)
+    child_uuid = os.read(read_fd, 64).decode()
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    assert child_uuid != Node().uuid
@@ -1,4 +1,6 @@
-from duip.model import Node
+import datetime
+
+from duip.model import Node, NodeState
 from duip.node import get_tree
 from flask import json
 
@@ -26,3 +28,51 @@ def test_node_list(app, client):
         # Bad node returns 404
         resp = client.get(f"/node/424242")
         assert resp.status_code == 404
+
+
+def test_node_list_tracks_changes(app, client):
+    with app.app_context():
+        tree = get_tree()
+        node = tree.tree.attach(Node())
+        assert json.loads(client.get("/node/").data)[0]["state"] == NodeState.CREATED
+        node.state = NodeState.RUNNING
+        assert json.loads(client.get("/node/").data)[0]["state"] == NodeState.RUNNING
+        tree.tree.attach(Node(node))
+        assert len(json.loads(client.get("/node/").data)) == 2
+
+
+def test_node_bulk_fetch(app, client):
+    with app.app_context():
+        tree = get_tree()
+        nodeA = tree.tree.attach(Node())
+        nodeB = tree.tree.attach(Node(nodeA))
+        tree.tree.attach(Node(nodeA))
+
+        resp = client.get(f"/node/?ids={nodeB.id},{nodeA.id},424242")
+        assert resp.status_code == 200
+        assert json.loads(resp.data) == [nodeB.to_dict(), nodeA.to_dict()]
+
+        resp = client.get(f"/node/?ids={nodeA.id},424242&strict=1")
+        assert resp.status_code == 404
+        resp = client.get(f"/node/?ids={nodeA.id},424242&strict=0")
+        assert resp.status_code == 200
+        assert json.loads(resp.data) == [nodeA.to_dict()]
+
+
+class DatedNode(Node):
+    def to_dict(self):
+        return {**super().to_dict(), "created": datetime.date(2020, 5, 1)}
+
+
+def test_node_custom_to_dict_encoding(app, client):
+    with app.app_context():
+        tree = get_tree()
+        node = tree.tree.attach(DatedNode())
+
+        for url in ("/node/", f"/node/{node.id}", f"/node/?ids={node.id}"):
+            resp = client.get(url)
+            assert resp.status_code == 200
+            data = json.loads(resp.data)
+            if isinstance(data, list):
+                (data,) = data
+            assert data["created"] == "Fri, 01 May 2020 00:00:00 GMT"